@@ -13,14 +13,24 @@ Environment Variable Modes:
 
 Set USE_GLOBAL_OPENAI=1 to force global endpoint path if both are present.
 
-The rest of the code can call create_client() and pass a 'model' string (either deployment
-name for Azure resource or model name for global inference).
+The rest of the code can call create_client() (or create_async_client() for concurrent
+callers) and pass a 'model' string (either deployment name for Azure resource or model
+name for global inference).
 """
 
 from __future__ import annotations
 import os
-from openai import OpenAI, AzureOpenAI
-from typing import Optional
+import atexit
+import httpx
+from openai import OpenAI, AsyncOpenAI, AzureOpenAI
+from typing import Dict, Optional, Tuple
+
+# One client per resolved endpoint so repeated create_client() calls reuse the
+# same connection pool instead of paying DNS/TLS setup again.
+_clients: Dict[Tuple[str, str], OpenAI] = {}
+_http_client: Optional[httpx.Client] = None
+_async_clients: Dict[Tuple[str, str], AsyncOpenAI] = {}
+_async_http_client: Optional[httpx.AsyncClient] = None
 
 
 def _verbose() -> bool:
@@ -30,8 +40,8 @@ def get_deployment_name() -> str:
     """Return the deployment name for the chat model from environment."""
     return os.environ.get("CHAT_MODEL", "gpt-4.1")
 
-def create_client(purpose: Optional[str] = None) -> OpenAI:
-    """Return an OpenAI client configured for Azure resource or global endpoint.
+def _resolve_endpoint(purpose: Optional[str] = None) -> Tuple[str, str]:
+    """Return (base_url, api_key) for Azure resource or global endpoint.
 
     Args:
         purpose: Optional hint (e.g. "embeddings") which allows forcing global endpoint
@@ -60,7 +70,7 @@ def create_client(purpose: Optional[str] = None) -> OpenAI:
     def make_global():
         if _verbose():
             print(f"[azure_openai] Using GLOBAL endpoint: {global_endpoint}")
-        return OpenAI(base_url=global_endpoint, api_key=global_key)
+        return global_endpoint, global_key
 
     # 1. Force global for embeddings
     if force_global_embed and global_key:
@@ -74,10 +84,7 @@ def create_client(purpose: Optional[str] = None) -> OpenAI:
     if azure_endpoint and azure_key:
         if _verbose():
             print(f"[azure_openai] Using AZURE RESOURCE endpoint: {azure_endpoint} (api_version={azure_api_version})")
-        return OpenAI(
-            base_url=azure_endpoint,
-            api_key=azure_key,
-        )
+        return azure_endpoint, azure_key
 
     # 4. Fallback global
     if global_key:
@@ -85,5 +92,71 @@ def create_client(purpose: Optional[str] = None) -> OpenAI:
 
     raise RuntimeError("No valid configuration. Set AZURE_OPENAI_* or OPENAI_API_KEY.")
 
+def _http_limits() -> httpx.Limits:
+    return httpx.Limits(max_connections=20, max_keepalive_connections=20, keepalive_expiry=60)
+
+def get_batch_endpoint(purpose: Optional[str] = None) -> str:
+    """Return the Batch API endpoint path for the endpoint create_client would use.
+
+    Azure resource endpoints already include the API prefix in their base URL and
+    expect "/chat/completions"; the global OpenAI-style endpoint expects "/v1/chat/completions".
+    """
+    base_url, _ = _resolve_endpoint(purpose)
+    if base_url == os.environ.get("AZURE_OPENAI_ENDPOINT"):
+        return "/chat/completions"
+    return "/v1/chat/completions"
+
+def _shared_http_client() -> httpx.Client:
+    """Return the process-wide HTTP/2 keep-alive client used by all sync OpenAI clients."""
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.Client(http2=True, limits=_http_limits())
+        atexit.register(_http_client.close)
+    return _http_client
+
+def _shared_async_http_client() -> httpx.AsyncClient:
+    """Return the HTTP/2 keep-alive client used by all async OpenAI clients.
+
+    Async connections are bound to the running event loop, so callers must await
+    close_async_clients() before the loop shuts down (atexit cannot do it).
+    """
+    global _async_http_client
+    if _async_http_client is None:
+        _async_http_client = httpx.AsyncClient(http2=True, limits=_http_limits())
+    return _async_http_client
+
+def create_client(purpose: Optional[str] = None) -> OpenAI:
+    """Return an OpenAI client configured for Azure resource or global endpoint.
 
-__all__ = ["create_client"]
+    See _resolve_endpoint for how the endpoint is selected. Clients are cached per
+    endpoint, so callers may invoke this freely without opening new connections.
+    """
+    base_url, api_key = _resolve_endpoint(purpose)
+    key = (base_url, api_key)
+    if key not in _clients:
+        _clients[key] = OpenAI(base_url=base_url, api_key=api_key, http_client=_shared_http_client())
+    return _clients[key]
+
+def create_async_client(purpose: Optional[str] = None) -> AsyncOpenAI:
+    """Async counterpart of create_client for callers issuing concurrent requests.
+
+    Cached per endpoint like create_client; concurrent requests are multiplexed over
+    the shared HTTP/2 connection pool.
+    """
+    base_url, api_key = _resolve_endpoint(purpose)
+    key = (base_url, api_key)
+    if key not in _async_clients:
+        _async_clients[key] = AsyncOpenAI(base_url=base_url, api_key=api_key,
+                                          http_client=_shared_async_http_client())
+    return _async_clients[key]
+
+async def close_async_clients() -> None:
+    """Close the shared async connection pool and forget cached async clients."""
+    global _async_http_client
+    _async_clients.clear()
+    if _async_http_client is not None:
+        await _async_http_client.aclose()
+        _async_http_client = None
+
+
+__all__ = ["create_client", "create_async_client", "close_async_clients", "get_batch_endpoint"]
@@ -0,0 +1,241 @@
+"""On-disk cache for deterministic (temperature=0) chat completions.
+
+Responses are keyed by sha256 of (model, system prompt, user query, temperature,
+max_tokens), so a changed completion budget never reuses an answer cut to the old
+one, and stored in a small SQLite file under LLM_CACHE_DIR (default ./.llm_cache).
+Entries expire after LLM_CACHE_TTL seconds (default 24h).
+
+Optional semantic layer: pass an async ``embed_fn`` (text -> embedding vector) and
+a query that misses the exact key can still be served by a cached answer whose
+query embedding has cosine similarity >= ``similarity_threshold`` under the same
+model / system prompt / temperature / max_tokens. Embeddings barely move when only an amount
+changes, so candidates must also contain exactly the same numbers as the query;
+a near-identical prompt about a different salary never reuses another answer.
+Rephrasings that spell numbers differently (e.g. "15 lakh" vs "1,500,000") simply miss.
+
+Manifest: ``record(test_id, ...)`` remembers which input hash a named test last
+ran with and the response it passed with, so ``get_unchanged`` can tell an
+incremental runner that the test's prompt, model, system prompt and token budget
+are unchanged and it need not re-run. The manifest keeps its own copy of the response so it does
+not depend on the response cache (which may hold a semantic match or nothing at all
+for a packed answer). A test whose inputs changed has its stale rows dropped.
+
+Cache failures (SQLite or embedding errors) are counted in ``stats["errors"]`` and
+treated as a miss or a skipped store; they never fail the request being cached.
+"""
+
+from __future__ import annotations
+import os, re, json, time, hashlib, sqlite3
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional
+import numpy as np
+
+DEFAULT_CACHE_DIR = Path(os.environ.get("LLM_CACHE_DIR", ".llm_cache"))
+DEFAULT_TTL = int(os.environ.get("LLM_CACHE_TTL", 86400))
+
+_NUMBER = re.compile(r"\d[\d,]*(?:\.\d+)?")
+
+
+def _sha256(payload: Dict) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+class LLMCache:
+    """SQLite-backed response cache with hit/miss stats."""
+
+    def __init__(self, cache_dir: Path = DEFAULT_CACHE_DIR, expire: int = DEFAULT_TTL,
+                 embed_fn: Optional[Callable[[str], Awaitable[List[float]]]] = None,
+                 similarity_threshold: float = 0.95, refresh: bool = False):
+        cache_dir = Path(cache_dir)
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        self.expire = expire
+        self.embed_fn = embed_fn
+        self.similarity_threshold = similarity_threshold
+        # refresh: lookups always miss (new responses are still stored)
+        self.refresh = refresh
+        self.stats = {"hits": 0, "semantic_hits": 0, "misses": 0, "errors": 0}
+        # Query embeddings computed by get(), reused by the matching set() on a miss
+        self._query_vectors: Dict[str, np.ndarray] = {}
+        self._db = sqlite3.connect(cache_dir / "responses.sqlite")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS responses (
+                   key TEXT PRIMARY KEY,
+                   scope TEXT NOT NULL,
+                   content TEXT NOT NULL,
+                   embedding BLOB,
+                   created_at REAL NOT NULL,
+                   expires_at REAL NOT NULL
+               )"""
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_scope ON responses(scope)")
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(manifest)")}
+        if columns and "response" not in columns:
+            # Older manifest layout without stored responses; it only drives skipping, so rebuild it
+            self._db.execute("DROP TABLE manifest")
+        self._db.execute(
+            """CREATE TABLE IF NOT EXISTS manifest (
+                   test_id TEXT PRIMARY KEY,
+                   key TEXT NOT NULL,
+                   response TEXT NOT NULL,
+                   updated_at REAL NOT NULL,
+                   expires_at REAL NOT NULL
+               )"""
+        )
+        self._db.commit()
+
+    @staticmethod
+    def make_key(model: str, system_prompt: str, user_query: str, temperature: float = 0,
+                 max_tokens: Optional[int] = None) -> str:
+        """Exact-match key for a single chat request."""
+        return _sha256({"m": model, "sys": system_prompt, "u": user_query, "t": temperature, "mt": max_tokens})
+
+    @staticmethod
+    def make_scope(model: str, system_prompt: str, user_query: str, temperature: float = 0,
+                   max_tokens: Optional[int] = None) -> str:
+        """Key shared by all queries that may be answered semantically from each other.
+
+        Includes the query's numbers in order, so only queries with identical figures match.
+        """
+        numbers = [n.replace(",", "") for n in _NUMBER.findall(user_query)]
+        return _sha256({"m": model, "sys": system_prompt, "t": temperature, "mt": max_tokens, "n": numbers})
+
+    async def get(self, model: str, system_prompt: str, user_query: str,
+                  temperature: float = 0, max_tokens: Optional[int] = None) -> Optional[str]:
+        """Return a cached response (exact, then semantic) or None on miss.
+
+        A storage or embedding failure counts as a miss; it never raises.
+        """
+        if self.refresh:
+            self.stats["misses"] += 1
+            return None
+        now = time.time()
+        key = self.make_key(model, system_prompt, user_query, temperature, max_tokens)
+        try:
+            row = self._db.execute(
+                "SELECT content FROM responses WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+        except sqlite3.Error:
+            self.stats["errors"] += 1
+            row = None
+        if row:
+            self.stats["hits"] += 1
+            return row[0]
+
+        if self.embed_fn is not None:
+            scope = self.make_scope(model, system_prompt, user_query, temperature, max_tokens)
+            content = await self._get_similar(key, scope, user_query, now)
+            if content is not None:
+                self.stats["semantic_hits"] += 1
+                return content
+
+        self.stats["misses"] += 1
+        return None
+
+    async def set(self, model: str, system_prompt: str, user_query: str, content: str,
+                  temperature: float = 0, expire: Optional[int] = None,
+                  max_tokens: Optional[int] = None) -> None:
+        """Store a response; embeds the query too when the semantic layer is enabled.
+
+        If embedding fails the response is stored for exact matches only; if storage
+        fails the response is dropped. Neither raises.
+        """
+        key = self.make_key(model, system_prompt, user_query, temperature, max_tokens)
+        embedding = None
+        if self.embed_fn is not None:
+            vector = self._query_vectors.pop(key, None)
+            if vector is None:
+                try:
+                    vector = np.asarray(await self.embed_fn(user_query), dtype="float32")
+                except Exception:
+                    self.stats["errors"] += 1
+            if vector is not None:
+                embedding = vector.tobytes()
+        now = time.time()
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    self.make_scope(model, system_prompt, user_query, temperature, max_tokens),
+                    content,
+                    embedding,
+                    now,
+                    now + (self.expire if expire is None else expire),
+                ),
+            )
+            self._db.commit()
+        except sqlite3.Error:
+            self.stats["errors"] += 1
+
+    def get_unchanged(self, test_id: str, model: str, system_prompt: str, user_query: str,
+                      temperature: float = 0, max_tokens: Optional[int] = None) -> Optional[str]:
+        """Return the recorded response for test_id if its inputs match the last recorded run.
+
+        If the recorded inputs differ, the stale manifest entry and its cached response are removed.
+        """
+        if self.refresh:
+            return None
+        key = self.make_key(model, system_prompt, user_query, temperature, max_tokens)
+        try:
+            row = self._db.execute(
+                "SELECT key, response, expires_at FROM manifest WHERE test_id = ?", (test_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            recorded_key, response, expires_at = row
+            if recorded_key != key:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (recorded_key,))
+                self._db.execute("DELETE FROM manifest WHERE test_id = ?", (test_id,))
+                self._db.commit()
+                return None
+        except sqlite3.Error:
+            self.stats["errors"] += 1
+            return None
+        return response if expires_at > time.time() else None
+
+    def record(self, test_id: str, model: str, system_prompt: str, user_query: str, response: str,
+               temperature: float = 0, expire: Optional[int] = None,
+               max_tokens: Optional[int] = None) -> None:
+        """Remember the inputs test_id last ran with and the response it produced."""
+        now = time.time()
+        try:
+            self._db.execute(
+                "INSERT OR REPLACE INTO manifest VALUES (?, ?, ?, ?, ?)",
+                (
+                    test_id,
+                    self.make_key(model, system_prompt, user_query, temperature, max_tokens),
+                    response,
+                    now,
+                    now + (self.expire if expire is None else expire),
+                ),
+            )
+            self._db.commit()
+        except sqlite3.Error:
+            self.stats["errors"] += 1
+
+    async def _get_similar(self, key: str, scope: str, user_query: str, now: float) -> Optional[str]:
+        try:
+            rows = self._db.execute(
+                "SELECT content, embedding FROM responses WHERE scope = ? AND expires_at > ? AND embedding IS NOT NULL",
+                (scope, now),
+            ).fetchall()
+            if not rows:
+                return None
+            query_vec = np.asarray(await self.embed_fn(user_query), dtype="float32")
+        except Exception:
+            self.stats["errors"] += 1
+            return None
+        self._query_vectors[key] = query_vec
+        matrix = np.stack([np.frombuffer(emb, dtype="float32") for _, emb in rows])
+        sims = matrix @ query_vec / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(query_vec) + 1e-12)
+        best = int(np.argmax(sims))
+        if sims[best] >= self.similarity_threshold:
+            self._query_vectors.pop(key, None)
+            return rows[best][0]
+        return None
+
+    def close(self) -> None:
+        self._db.close()
+
+
+__all__ = ["LLMCache"]
@@ -1,20 +1,12 @@
-import os
-from openai import OpenAI
 from dotenv import load_dotenv
+from azure_openai import create_client, get_deployment_name
 
 load_dotenv()
 
-endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
-deployment_name = os.getenv("CHAT_MODEL")
-api_key = os.getenv("AZURE_OPENAI_API_KEY")
-
-client = OpenAI(
-    base_url=endpoint,
-    api_key=api_key
-)
+client = create_client()
 
 completion = client.chat.completions.create(
-    model=deployment_name,
+    model=get_deployment_name(),
     messages=[
         {
             "role": "user",
@@ -1,17 +1,12 @@
 import os
-from openai import OpenAI
 from dotenv import load_dotenv
+from azure_openai import create_client
 
 load_dotenv()
 
-endpoint = os.getenv("AZURE_OPENAI_ENDPOINT")
 deployment_name = os.getenv("EMBED_MODEL")
-api_key = os.getenv("AZURE_OPENAI_API_KEY")
 
-client = OpenAI(
-    base_url=endpoint,
-    api_key=api_key,
-)
+client = create_client(purpose="embeddings")
 
 response = client.embeddings.create(
     input="How do I use Python in VS Code?",
@@ -5,198 +5,696 @@ Tests all the detailed tax scenarios and functionalities specified
 """
 
 import os
+import re
 import sys
 import json
-from typing import List, Dict, Any
-from azure_openai import create_client, get_deployment_name
+import time
+import asyncio
+import hashlib
+import argparse
+import tiktoken
+import ahocorasick
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Set, Tuple
+from azure_openai import create_async_client, close_async_clients, get_batch_endpoint, get_deployment_name
+from llm_cache import LLMCache
 
+# Upper bound on in-flight requests so the suite stays under Azure RPM limits
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("TEST_MAX_CONCURRENCY", 10))
+
+# Batch API settings (--batch); the endpoint path comes from azure_openai.get_batch_endpoint()
+BATCH_POLL_INTERVAL = int(os.environ.get("OPENAI_BATCH_POLL_SECONDS", 30))
+# Stop polling (and cancel the batch) after the 24h completion window plus some slack
+BATCH_MAX_WAIT = int(os.environ.get("OPENAI_BATCH_MAX_WAIT_SECONDS", 25 * 3600))
+BATCH_TERMINAL_STATES = {"completed", "failed", "expired", "cancelled"}
+
+# Validation: a response passes when it mentions at least MIN_EXPECTED_ELEMENTS of these terms
+EXPECTED_ELEMENTS = frozenset({
+    "tax", "deduction", "income", "₹", "section",
+    "calculation", "recommendation"
+})
+MIN_EXPECTED_ELEMENTS = 4
+
+# Output budget per test: validation only needs a few tax terms, not a full answer.
+# Categories whose answers take longer to reach the required terms get their own budget.
+MAX_TOKENS_FOR_VALIDATION = 400
+CATEGORY_MAX_TOKENS = {
+    "🏠 HRA & Housing Analysis": 300,
+    "📊 Tax Assessment": 600,
+}
+_LONGEST_ELEMENT = max(len(element) for element in EXPECTED_ELEMENTS)
+
+# Single-pass multi-term scan over a response
+_EXPECTED_AUTOMATON = ahocorasick.Automaton()
+for _element in EXPECTED_ELEMENTS:
+    _EXPECTED_AUTOMATON.add_word(_element, _element)
+_EXPECTED_AUTOMATON.make_automaton()
+
+# Local token accounting: prompts are counted with tiktoken before sending so
+# max_tokens never overruns the model context window
+MODEL_CONTEXT_LIMITS = {
+    "gpt-4.1": 1047576,
+    "gpt-4.1-mini": 1047576,
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+}
+DEFAULT_CONTEXT_LIMIT = int(os.environ.get("MODEL_CONTEXT_LIMIT", 128000))
+CONTEXT_SAFETY_MARGIN = 32   # tokens reserved for chat message framing
+MIN_COMPLETION_TOKENS = 100  # below this headroom a test is skipped rather than sent
+TOKENS_PER_MINUTE = int(os.environ.get("TEST_TOKENS_PER_MINUTE", 0))  # 0 disables TPM throttling
+
+# Multi-query packing (--pack): answers are delimited by ===Q<i>=== markers
+DEFAULT_PACK_SIZE = 5
+PACKED_ANSWER_MARKER = re.compile(r"===Q(\d+)===")
+
+# Send an explicit prompt_cache_key so every request sharing the system prompt is
+# routed to the same server-side prefix cache (only for endpoints that accept it)
+USE_PROMPT_CACHE_KEY = os.environ.get("OPENAI_PROMPT_CACHE_KEY", "").lower() in {"1", "true", "yes"}
+
+# Test scenarios covering all specified requirements
+TEST_SCENARIOS = [
+    {
+        "category": "📋 Form 16 Analysis",
+        "tests": [
+            {
+                "name": "Form 16 Part A & B Analysis",
+                "query": "I have a Form 16 with basic salary of ₹800,000, HRA of ₹240,000, and TDS of ₹45,000. Analyze Part A and Part B components in detail including salary breakdown, deductions claimed, and tax calculations."
+            },
+            {
+                "name": "Salary Component Breakdown",
+                "query": "My CTC is ₹1,200,000 with basic ₹600,000, HRA ₹180,000, special allowance ₹300,000, and EPF contribution ₹21,600. Break down all components and their tax implications."
+            }
+        ]
+    },
+    {
+        "category": "⚖️ Tax Regime Comparison",
+        "tests": [
+            {
+                "name": "Old vs New Regime Analysis",
+                "query": "Compare old vs new tax regime for salary ₹1,500,000, with 80C investments ₹150,000, health insurance ₹25,000, and home loan interest ₹200,000. Which regime is better?"
+            },
+            {
+                "name": "Multi-year Regime Projection",
+                "query": "I'm 28 years old, earning ₹800,000 annually with expected 15% yearly growth. Compare both regimes for next 5 years and recommend optimal strategy."
+            }
+        ]
+    },
+    {
+        "category": "💰 Investment & Deduction Analysis",
+        "tests": [
+            {
+                "name": "Complete Deduction Analysis",
+                "query": "Analyze all possible deductions for my situation: Section 80C, 80D, 80E, 80G, 80TTA. My salary is ₹1,000,000, I have health insurance premiums ₹30,000, education loan interest ₹45,000."
+            },
+            {
+                "name": "Investment Recommendations",
+                "query": "I'm 30 years old, risk-moderate investor, salary ₹1,200,000. Recommend optimal tax-saving investments and long-term wealth creation strategy."
+            }
+        ]
+    },
+    {
+        "category": "🏠 HRA & Housing Analysis",
+        "tests": [
+            {
+                "name": "HRA Optimization",
+                "query": "I live in Mumbai (metro), pay rent ₹25,000/month, HRA component ₹300,000, basic salary ₹600,000. Calculate optimal HRA exemption and benefits."
+            },
+            {
+                "name": "Rent vs Buy Analysis",
+                "query": "Should I buy a house with home loan EMI ₹40,000/month or continue renting at ₹25,000/month? My salary is ₹1,500,000. Show tax implications."
+            }
+        ]
+    },
+    {
+        "category": "🩺 Health Insurance Analysis",
+        "tests": [
+            {
+                "name": "Section 80D Optimization",
+                "query": "I pay health insurance: ₹15,000 for self, ₹25,000 for parents (age 58), ₹30,000 for parents-in-law (age 65). Calculate Section 80D benefits and optimization."
+            }
+        ]
+    },
+    {
+        "category": "📊 Tax Assessment",
+        "tests": [
+            {
+                "name": "Complete Tax Liability Assessment",
+                "query": "Calculate my tax assessment: Gross salary ₹1,800,000, HRA exempt ₹180,000, 80C deductions ₹150,000, TDS ₹165,000. Am I due for refund or additional payment?"
+            },
+            {
+                "name": "Next Year Planning",
+                "query": "Based on current year tax liability of ₹200,000, plan investments and strategies for next financial year to minimize tax burden."
+            }
+        ]
+    },
+    {
+        "category": "📄 ITR & Compliance",
+        "tests": [
+            {
+                "name": "ITR Filing Guidance",
+                "query": "I'm a salaried employee with salary income, bank interest ₹15,000, and capital gains from mutual funds ₹25,000. Which ITR form should I use?"
+            }
+        ]
+    }
+]
+
+@lru_cache(maxsize=1)
 def load_system_prompt() -> str:
-    """Load the comprehensive system prompt."""
+    """Load the comprehensive system prompt (read from disk once per process)."""
     path = "docs/system_prompt.md"
     if os.path.exists(path):
         with open(path, 'r', encoding='utf-8') as f:
             return f.read()
     return "Default system prompt"
 
-def test_ai_response(client, model: str, system_prompt: str, user_query: str) -> str:
-    """Test AI response to a specific query."""
+def prompt_cache_params(system_prompt: str) -> Dict[str, Any]:
+    """Extra body params tying requests to the system-prompt prefix cache.
+
+    The system prompt must stay byte-identical and first in `messages` for the
+    prefix cache to hit; anything per-test goes in the trailing user message.
+    """
+    if not USE_PROMPT_CACHE_KEY:
+        return {}
+    return {"prompt_cache_key": hashlib.sha256(system_prompt.encode("utf-8")).hexdigest()}
+
+def max_tokens_for(category: str) -> int:
+    """Output token budget for tests in a category."""
+    return CATEGORY_MAX_TOKENS.get(category, MAX_TOKENS_FOR_VALIDATION)
+
+@lru_cache(maxsize=None)
+def encoding_for(model: str) -> "tiktoken.Encoding":
+    """tiktoken encoding for a model; deployment names tiktoken doesn't know use o200k_base."""
     try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+@lru_cache(maxsize=256)
+def count_tokens(model: str, text: str) -> int:
+    """Token count of text (cached, so the shared system prompt is encoded once)."""
+    return len(encoding_for(model).encode(text))
+
+def plan_max_tokens(model: str, system_prompt: str, user_query: str, budget: int) -> Tuple[int, int]:
+    """Return (max_tokens, prompt_tokens), shrinking the budget to fit the context window.
+
+    Raises ValueError if the prompt leaves less than MIN_COMPLETION_TOKENS of headroom.
+    """
+    context_limit = MODEL_CONTEXT_LIMITS.get(model, DEFAULT_CONTEXT_LIMIT)
+    used = count_tokens(model, system_prompt) + count_tokens(model, user_query)
+    if used > context_limit - MIN_COMPLETION_TOKENS:
+        raise ValueError(f"prompt uses {used} tokens, exceeding the {context_limit}-token context of {model}")
+    return min(budget, context_limit - used - CONTEXT_SAFETY_MARGIN), used
+
+class TokenRateLimiter:
+    """Token bucket throttling prompt + completion tokens per minute across concurrent tests."""
+    
+    def __init__(self, tokens_per_minute: int):
+        self.capacity = tokens_per_minute
+        self.available = float(tokens_per_minute)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self, tokens: int) -> None:
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.available = min(self.capacity,
+                                     self.available + (now - self.updated) * self.capacity / 60)
+                self.updated = now
+                if self.available >= tokens:
+                    self.available -= tokens
+                    return
+                await asyncio.sleep((tokens - self.available) * 60 / self.capacity)
+
+def find_expected_elements(response_folded: str) -> Set[str]:
+    """EXPECTED_ELEMENTS present in an already case-folded response."""
+    return {element for _, element in _EXPECTED_AUTOMATON.iter(response_folded)}
+
+async def test_ai_response(client, model: str, system_prompt: str, user_query: str,
+                           semaphore: asyncio.Semaphore, cache: Optional[LLMCache] = None,
+                           early_stop: bool = True, max_tokens: int = MAX_TOKENS_FOR_VALIDATION,
+                           rate_limiter: Optional[TokenRateLimiter] = None) -> Tuple[str, bool]:
+    """Test AI response to a specific query, served from cache when possible.
+
+    The completion is streamed; with early_stop the stream is closed as soon as
+    MIN_EXPECTED_ELEMENTS validation terms have appeared, so generation stops
+    server-side instead of running to max_tokens.
+
+    Returns (content, early_stopped). Only complete answers that pass validation are
+    written to the response cache; early-stopped content is a fragment and never is.
+    """
+    early_stopped = False
+    try:
+        max_tokens, prompt_tokens = plan_max_tokens(model, system_prompt, user_query, max_tokens)
+        if cache is not None:
+            cached = await cache.get(model, system_prompt, user_query, temperature=0, max_tokens=max_tokens)
+            if cached is not None:
+                return cached, False
+        
         messages = [
             {"role": "system", "content": system_prompt},
             {"role": "user", "content": user_query}
         ]
         
-        response = client.chat.completions.create(
-            model=model,
-            temperature=0,
-            messages=messages,
-            max_tokens=1500
-        )
+        if rate_limiter is not None:
+            await rate_limiter.acquire(prompt_tokens + max_tokens)
+        async with semaphore:
+            stream = await client.chat.completions.create(
+                model=model,
+                temperature=0,
+                messages=messages,
+                max_tokens=max_tokens,
+                stream=True,
+                extra_body=prompt_cache_params(system_prompt) or None
+            )
+            
+            parts: List[str] = []
+            folded = ""
+            found: Set[str] = set()
+            async for chunk in stream:
+                # Azure may send chunks without choices (e.g. content filter results)
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if not delta:
+                    continue
+                parts.append(delta)
+                if not early_stop:
+                    continue
+                # Only rescan the new text plus enough overlap to catch split terms
+                scan_from = max(0, len(folded) - _LONGEST_ELEMENT + 1)
+                folded += delta.casefold()
+                found |= find_expected_elements(folded[scan_from:])
+                if len(found) >= MIN_EXPECTED_ELEMENTS:
+                    early_stopped = True
+                    await stream.close()
+                    break
         
-        return response.choices[0].message.content
+        content = "".join(parts)
+        if cache is not None and not early_stopped and passes_validation(content):
+            await cache.set(model, system_prompt, user_query, content, temperature=0, max_tokens=max_tokens)
+        return content, early_stopped
         
     except Exception as e:
-        return f"Error: {str(e)}"
+        return f"Error: {str(e)}", early_stopped
+
+def build_packed_query(queries: List[str]) -> str:
+    """Combine several queries into one user message with per-answer markers."""
+    numbered = "\n".join(f"{i}. {q}" for i, q in enumerate(queries, 1))
+    return (
+        "Answer each of the following questions independently and completely. "
+        "Start each answer with its marker on its own line, e.g. '===Q1===' for question 1, "
+        "and do not use these markers anywhere else.\n\n" + numbered
+    )
+
+def split_packed_response(content: str, count: int) -> List[str]:
+    """Split a packed response back into `count` answers, in question order."""
+    parts = PACKED_ANSWER_MARKER.split(content or "")
+    answers: Dict[int, str] = {}
+    for number, answer in zip(parts[1::2], parts[2::2]):
+        answers.setdefault(int(number), answer.strip() or f"Error: empty answer for Q{number} in packed response")
+    return [answers.get(i, f"Error: no answer for Q{i} in packed response") for i in range(1, count + 1)]
 
-def run_comprehensive_tests():
-    """Run comprehensive tests for all tax scenarios."""
+async def fetch_responses_packed(client, model: str, system_prompt: str, user_queries: List[str],
+                                 semaphore: asyncio.Semaphore, cache: Optional[LLMCache] = None,
+                                 max_tokens: Optional[List[int]] = None,
+                                 rate_limiter: Optional[TokenRateLimiter] = None) -> List[str]:
+    """Answer several queries with a single chat completion; cached queries are not resent.
+
+    max_tokens holds the per-query output budget; the request gets the sum for uncached queries.
+    Packed answers are written in multi-question context, so they are never stored in the
+    single-query cache.
+    """
+    if max_tokens is None:
+        max_tokens = [MAX_TOKENS_FOR_VALIDATION] * len(user_queries)
+    responses: List[Optional[str]] = [None] * len(user_queries)
+    pending: List[int] = []
+    for i, query in enumerate(user_queries):
+        cached = None
+        if cache is not None:
+            # Look up under the budget the query would get on its own, as the streaming path stores it
+            try:
+                budget, _ = plan_max_tokens(model, system_prompt, query, max_tokens[i])
+            except Exception:
+                budget = None
+            if budget is not None:
+                cached = await cache.get(model, system_prompt, query, temperature=0, max_tokens=budget)
+        if cached is not None:
+            responses[i] = cached
+        else:
+            pending.append(i)
+    
+    if pending:
+        try:
+            packed_query = build_packed_query([user_queries[i] for i in pending])
+            pack_max_tokens, prompt_tokens = plan_max_tokens(model, system_prompt, packed_query,
+                                                             sum(max_tokens[i] for i in pending))
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": packed_query}
+            ]
+            
+            if rate_limiter is not None:
+                await rate_limiter.acquire(prompt_tokens + pack_max_tokens)
+            async with semaphore:
+                response = await client.chat.completions.create(
+                    model=model,
+                    temperature=0,
+                    messages=messages,
+                    max_tokens=pack_max_tokens,
+                    extra_body=prompt_cache_params(system_prompt) or None
+                )
+            
+            answers = split_packed_response(response.choices[0].message.content, len(pending))
+        except Exception as e:
+            answers = [f"Error: {str(e)}"] * len(pending)
+        
+        for i, answer in zip(pending, answers):
+            responses[i] = answer
+    
+    return responses
+
+def build_batch_requests(model: str, system_prompt: str, tests: List[Tuple[str, Dict[str, str]]],
+                         endpoint: str, max_tokens: List[int]) -> List[Dict[str, Any]]:
+    """Build one Batch API request line per test, identified by category:name.
+
+    max_tokens holds each test's already-planned output budget (see plan_max_tokens).
+    """
+    return [
+        {
+            "custom_id": make_test_id(category, test),
+            "method": "POST",
+            "url": endpoint,
+            "body": {
+                "model": model,
+                "temperature": 0,
+                "max_tokens": budget,
+                "messages": [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": test['query']}
+                ],
+                **prompt_cache_params(system_prompt)
+            }
+        }
+        for (category, test), budget in zip(tests, max_tokens)
+    ]
+
+def parse_batch_results(text: str) -> Dict[str, str]:
+    """Map custom_id to response content (or an "Error: ..." string) for a batch output/error file."""
+    results: Dict[str, str] = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        response = record.get("response") or {}
+        body = response.get("body") or {}
+        if record.get("error"):
+            error = record["error"]
+            results[record["custom_id"]] = f"Error: {error.get('message', error) if isinstance(error, dict) else error}"
+        elif response.get("status_code") != 200:
+            error = body.get("error")
+            message = error.get("message") if isinstance(error, dict) else error
+            results[record["custom_id"]] = f"Error: HTTP {response.get('status_code')}: {message or 'request failed'}"
+        else:
+            try:
+                results[record["custom_id"]] = body["choices"][0]["message"]["content"]
+            except (KeyError, IndexError, TypeError):
+                results[record["custom_id"]] = "Error: batch response has no choices"
+    return results
+
+async def run_batch(client, model: str, system_prompt: str, tests: List[Tuple[str, Dict[str, str]]],
+                    cache: Optional[LLMCache] = None) -> List[str]:
+    """Submit uncached tests as a single Batch API job and return responses in test order."""
+    responses: List[Optional[str]] = [None] * len(tests)
+    pending: List[int] = []
+    budgets: List[int] = []
+    for i, (category, test) in enumerate(tests):
+        # Any per-test failure (oversized prompt, tokenizer download) fails that test only
+        try:
+            budget, _ = plan_max_tokens(model, system_prompt, test['query'], max_tokens_for(category))
+        except Exception as e:
+            responses[i] = f"Error: {str(e)}"
+            continue
+        cached = await cache.get(model, system_prompt, test['query'], temperature=0,
+                                 max_tokens=budget) if cache is not None else None
+        if cached is not None:
+            responses[i] = cached
+            continue
+        pending.append(i)
+        budgets.append(budget)
+    
+    if pending:
+        endpoint = get_batch_endpoint()
+        requests = build_batch_requests(model, system_prompt, [tests[i] for i in pending], endpoint, budgets)
+        payload = "\n".join(json.dumps(r, ensure_ascii=False) for r in requests).encode("utf-8")
+        
+        batch_file = await client.files.create(file=("tax_test_batch.jsonl", payload), purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint=endpoint,
+            completion_window="24h"
+        )
+        print(f"📦 Submitted batch {batch.id} with {len(requests)} requests")
+        
+        started = time.time()
+        failure = None
+        try:
+            while batch.status not in BATCH_TERMINAL_STATES:
+                if time.time() - started > BATCH_MAX_WAIT:
+                    await client.batches.cancel(batch.id)
+                    failure = f"batch {batch.id} did not finish within {BATCH_MAX_WAIT}s and was cancelled"
+                    break
+                await asyncio.sleep(BATCH_POLL_INTERVAL)
+                batch = await client.batches.retrieve(batch.id)
+                print(f"   ⏳ Batch status: {batch.status} ({int(time.time() - started)}s elapsed)")
+        except (asyncio.CancelledError, KeyboardInterrupt):
+            print(f"\n🛑 Interrupted; cancelling batch {batch.id}")
+            await client.batches.cancel(batch.id)
+            raise
+        
+        if failure is None:
+            failure = f"no batch result (batch status: {batch.status})"
+            if batch.errors and batch.errors.data:
+                failure += f": {batch.errors.data[0].message}"
+        
+        results: Dict[str, str] = {}
+        for file_id in (batch.error_file_id, batch.output_file_id):
+            if file_id:
+                output = await client.files.content(file_id)
+                results.update(parse_batch_results(output.text))
+        
+        for i, budget, request in zip(pending, budgets, requests):
+            content = results.get(request["custom_id"], f"Error: {failure}")
+            if cache is not None and passes_validation(content):
+                await cache.set(model, system_prompt, tests[i][1]['query'], content, temperature=0,
+                                max_tokens=budget)
+            responses[i] = content
+    
+    return responses
+
+def build_cache(force: bool = False) -> Optional[LLMCache]:
+    """Create the response cache unless LLM_CACHE=0; LLM_CACHE_SEMANTIC=1 adds embedding lookups.
+
+    Embeddings go through the async client so semantic lookups don't block the event loop.
+
+    With force, cached responses are ignored but fresh ones are still stored.
+    """
+    if os.environ.get("LLM_CACHE", "1").lower() in {"0", "false", "no"}:
+        return None
+    
+    embed_fn = None
+    if os.environ.get("LLM_CACHE_SEMANTIC", "").lower() in {"1", "true", "yes"}:
+        embed_client = create_async_client(purpose="embeddings")
+        embed_model = os.environ.get("EMBED_MODEL", "text-embedding-3-small")
+        
+        async def embed_fn(text: str) -> List[float]:
+            response = await embed_client.embeddings.create(model=embed_model, input=text)
+            return response.data[0].embedding
+    return LLMCache(embed_fn=embed_fn, refresh=force)
+
+def make_test_id(category: str, test: Dict[str, str]) -> str:
+    """Stable identifier for a test (batch custom_id and cache manifest key)."""
+    return f"{category}:{test['name']}"
+
+def passes_validation(response: Optional[str]) -> bool:
+    """True if a response is not an error and has enough expected tax terms."""
+    if not response or response.startswith("Error:"):
+        return False
+    return len(find_expected_elements(response.casefold())) >= MIN_EXPECTED_ELEMENTS
+
+def flatten_scenarios(scenarios: List[Dict[str, Any]]) -> List[Tuple[str, Dict[str, str]]]:
+    """Flatten categories into ordered (category, test) pairs."""
+    return [(category["category"], test) for category in scenarios for test in category["tests"]]
+
+def report_test_result(test: Dict[str, str], response: str, early_stopped: bool = False) -> bool:
+    """Validate and print a single test response. Returns True if it passed."""
+    passed = False
+    print(f"\n🔍 Testing: {test['name']}")
+    
+    response_lower = response.casefold() if response else ""
+    if passes_validation(response):
+        print("✅ PASSED - Response contains relevant tax information")
+        passed = True
+        
+        # Show key insights from response
+        if "regime" in test['query'].lower():
+            print("   📊 Regime comparison analysis provided")
+        if "investment" in test['query'].lower():
+            print("   💰 Investment recommendations included")
+        if "hra" in test['query'].lower():
+            print("   🏠 HRA analysis completed")
+        if "80c" in response_lower or "80d" in response_lower:
+            print("   📋 Section-wise deduction analysis provided")
+            
+    elif response and not response.startswith("Error:"):
+        found_elements = len(find_expected_elements(response_lower))
+        print("❌ FAILED - Response lacks sufficient tax-related content")
+        print(f"   Found elements: {found_elements}/{len(EXPECTED_ELEMENTS)}")
+    else:
+        print(f"❌ FAILED - {response}")
+    
+    # Show response preview (first 200 characters)
+    # (an early-stopped stream was closed once validation passed, so it is not the full answer)
+    if response and len(response) > 200:
+        label = "Early-stopped response preview" if early_stopped else "Response preview"
+        print(f"   📝 {label}: {response[:200]}...")
+    elif response:
+        label = "Early-stopped response" if early_stopped else "Full response"
+        print(f"   📝 {label}: {response}")
+    
+    return passed
+
+async def run_comprehensive_tests(use_batch: bool = False, pack_size: int = 0, force: bool = False):
+    """Run comprehensive tests for all tax scenarios.
+
+    Args:
+        use_batch: Submit all scenarios as one Batch API job (50% cost, results within 24h)
+                   instead of concurrent chat.completions calls.
+        pack_size: If > 1, answer up to this many scenarios per chat.completions request
+                   (fewer requests against the RPM limit, system prompt billed once per pack).
+        force: Re-run every test, ignoring cached responses and the unchanged-test manifest.
+    """
     print("🧾 Starting Comprehensive Tax Assistant System Tests")
     print("=" * 60)
     
     try:
         # Initialize client
-        client = create_client()
+        client = create_async_client()
         model = get_deployment_name()
         system_prompt = load_system_prompt()
+        cache = build_cache(force=force)
         
         print(f"✅ AI Client initialized successfully")
         print(f"📋 Model: {model}")
         print(f"📄 System prompt loaded: {len(system_prompt)} characters")
+        if use_batch:
+            print("🚚 Mode: Batch API")
+        elif pack_size > 1:
+            print(f"🚚 Mode: packed chat completions ({pack_size} queries per request)")
+        else:
+            print("🚚 Mode: concurrent chat completions")
         print()
         
-        # Test scenarios covering all specified requirements
-        test_scenarios = [
-            {
-                "category": "📋 Form 16 Analysis",
-                "tests": [
-                    {
-                        "name": "Form 16 Part A & B Analysis",
-                        "query": "I have a Form 16 with basic salary of ₹800,000, HRA of ₹240,000, and TDS of ₹45,000. Analyze Part A and Part B components in detail including salary breakdown, deductions claimed, and tax calculations."
-                    },
-                    {
-                        "name": "Salary Component Breakdown",
-                        "query": "My CTC is ₹1,200,000 with basic ₹600,000, HRA ₹180,000, special allowance ₹300,000, and EPF contribution ₹21,600. Break down all components and their tax implications."
-                    }
-                ]
-            },
-            {
-                "category": "⚖️ Tax Regime Comparison",
-                "tests": [
-                    {
-                        "name": "Old vs New Regime Analysis",
-                        "query": "Compare old vs new tax regime for salary ₹1,500,000, with 80C investments ₹150,000, health insurance ₹25,000, and home loan interest ₹200,000. Which regime is better?"
-                    },
-                    {
-                        "name": "Multi-year Regime Projection",
-                        "query": "I'm 28 years old, earning ₹800,000 annually with expected 15% yearly growth. Compare both regimes for next 5 years and recommend optimal strategy."
-                    }
-                ]
-            },
-            {
-                "category": "💰 Investment & Deduction Analysis",
-                "tests": [
-                    {
-                        "name": "Complete Deduction Analysis",
-                        "query": "Analyze all possible deductions for my situation: Section 80C, 80D, 80E, 80G, 80TTA. My salary is ₹1,000,000, I have health insurance premiums ₹30,000, education loan interest ₹45,000."
-                    },
-                    {
-                        "name": "Investment Recommendations",
-                        "query": "I'm 30 years old, risk-moderate investor, salary ₹1,200,000. Recommend optimal tax-saving investments and long-term wealth creation strategy."
-                    }
-                ]
-            },
-            {
-                "category": "🏠 HRA & Housing Analysis",
-                "tests": [
-                    {
-                        "name": "HRA Optimization",
-                        "query": "I live in Mumbai (metro), pay rent ₹25,000/month, HRA component ₹300,000, basic salary ₹600,000. Calculate optimal HRA exemption and benefits."
-                    },
-                    {
-                        "name": "Rent vs Buy Analysis",
-                        "query": "Should I buy a house with home loan EMI ₹40,000/month or continue renting at ₹25,000/month? My salary is ₹1,500,000. Show tax implications."
-                    }
-                ]
-            },
-            {
-                "category": "🩺 Health Insurance Analysis",
-                "tests": [
-                    {
-                        "name": "Section 80D Optimization",
-                        "query": "I pay health insurance: ₹15,000 for self, ₹25,000 for parents (age 58), ₹30,000 for parents-in-law (age 65). Calculate Section 80D benefits and optimization."
-                    }
-                ]
-            },
-            {
-                "category": "📊 Tax Assessment",
-                "tests": [
-                    {
-                        "name": "Complete Tax Liability Assessment",
-                        "query": "Calculate my tax assessment: Gross salary ₹1,800,000, HRA exempt ₹180,000, 80C deductions ₹150,000, TDS ₹165,000. Am I due for refund or additional payment?"
-                    },
-                    {
-                        "name": "Next Year Planning",
-                        "query": "Based on current year tax liability of ₹200,000, plan investments and strategies for next financial year to minimize tax burden."
-                    }
-                ]
-            },
-            {
-                "category": "📄 ITR & Compliance",
-                "tests": [
-                    {
-                        "name": "ITR Filing Guidance",
-                        "query": "I'm a salaried employee with salary income, bank interest ₹15,000, and capital gains from mutual funds ₹25,000. Which ITR form should I use?"
-                    }
-                ]
-            }
-        ]
-        
-        # Run tests for each category
-        total_tests = sum(len(category["tests"]) for category in test_scenarios)
+        flat_tests = flatten_scenarios(TEST_SCENARIOS)
+        total_tests = len(flat_tests)
         passed_tests = 0
+        skipped_tests = 0
+        
+        # Skip tests whose inputs (including the planned token budget) are unchanged since
+        # a run that produced a passing response
+        skipped = set()
+        planned: Dict[int, int] = {}
+        if cache is not None:
+            for i, (category, test) in enumerate(flat_tests):
+                try:
+                    planned[i], _ = plan_max_tokens(model, system_prompt, test['query'], max_tokens_for(category))
+                except Exception:
+                    continue  # the run itself reports the planning error
+                previous = cache.get_unchanged(make_test_id(category, test), model, system_prompt,
+                                               test['query'], temperature=0, max_tokens=planned[i])
+                if passes_validation(previous):
+                    skipped.add(i)
+        to_run = [pair for i, pair in enumerate(flat_tests) if i not in skipped]
+        
+        rate_limiter = TokenRateLimiter(TOKENS_PER_MINUTE) if TOKENS_PER_MINUTE > 0 else None
+        try:
+            # Only the streaming path can stop early; other modes return complete answers
+            run_early_stopped = [False] * len(to_run)
+            if not to_run:
+                run_responses = []
+            elif use_batch:
+                run_responses = await run_batch(client, model, system_prompt, to_run, cache)
+            elif pack_size > 1:
+                semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+                queries = [test['query'] for _, test in to_run]
+                budgets = [max_tokens_for(category) for category, _ in to_run]
+                starts = range(0, len(queries), pack_size)
+                packs = await asyncio.gather(
+                    *(fetch_responses_packed(client, model, system_prompt, queries[i:i + pack_size],
+                                             semaphore, cache, budgets[i:i + pack_size], rate_limiter)
+                      for i in starts),
+                    return_exceptions=True
+                )
+                run_responses = []
+                for start, pack in zip(starts, packs):
+                    if isinstance(pack, BaseException):
+                        pack = [f"Error: {str(pack)}"] * len(queries[start:start + pack_size])
+                    run_responses.extend(pack)
+            else:
+                # Fire all scenarios concurrently; gather keeps submission order.
+                # With a cache, stream full answers so passing ones can be stored and reused.
+                semaphore = asyncio.Semaphore(MAX_CONCURRENT_REQUESTS)
+                results = await asyncio.gather(
+                    *(test_ai_response(client, model, system_prompt, test['query'], semaphore, cache,
+                                       early_stop=cache is None, max_tokens=max_tokens_for(category),
+                                       rate_limiter=rate_limiter)
+                      for category, test in to_run),
+                    return_exceptions=True
+                )
+                run_responses = [r if isinstance(r, BaseException) else r[0] for r in results]
+                run_early_stopped = [not isinstance(r, BaseException) and r[1] for r in results]
+        finally:
+            await close_async_clients()
         
-        for category in test_scenarios:
-            print(f"\n{category['category']}")
-            print("-" * 40)
+        run_iter = iter(zip(run_responses, run_early_stopped))
+        current_category = None
+        for i, (category, test) in enumerate(flat_tests):
+            if category != current_category:
+                current_category = category
+                print(f"\n{category}")
+                print("-" * 40)
             
-            for test in category["tests"]:
+            if i in skipped:
                 print(f"\n🔍 Testing: {test['name']}")
-                response = test_ai_response(client, model, system_prompt, test['query'])
-                
-                if response and not response.startswith("Error:"):
-                    # Basic validation - check if response contains expected elements
-                    response_lower = response.lower()
-                    expected_elements = [
-                        "tax", "deduction", "income", "₹", "section",
-                        "calculation", "recommendation"
-                    ]
-                    
-                    found_elements = sum(1 for element in expected_elements if element in response_lower)
-                    
-                    if found_elements >= 4:  # At least 4 tax-related terms
-                        print("✅ PASSED - Response contains relevant tax information")
-                        passed_tests += 1
-                        
-                        # Show key insights from response
-                        if "regime" in test['query'].lower():
-                            print("   📊 Regime comparison analysis provided")
-                        if "investment" in test['query'].lower():
-                            print("   💰 Investment recommendations included")
-                        if "hra" in test['query'].lower():
-                            print("   🏠 HRA analysis completed")
-                        if "80c" in response_lower or "80d" in response_lower:
-                            print("   📋 Section-wise deduction analysis provided")
-                            
-                    else:
-                        print("❌ FAILED - Response lacks sufficient tax-related content")
-                        print(f"   Found elements: {found_elements}/{len(expected_elements)}")
-                else:
-                    print(f"❌ FAILED - {response}")
-                
-                # Show response preview (first 200 characters)
-                if response and len(response) > 200:
-                    print(f"   📝 Response preview: {response[:200]}...")
-                elif response:
-                    print(f"   📝 Full response: {response}")
+                print("⏭ SKIPPED (unchanged)")
+                passed_tests += 1
+                skipped_tests += 1
+                continue
+            
+            response, early_stopped = next(run_iter)
+            if isinstance(response, BaseException):
+                response = f"Error: {str(response)}"
+            
+            if report_test_result(test, response, early_stopped):
+                passed_tests += 1
+            # Packed answers aren't cached, so there is nothing to skip against next run
+            if cache is not None and pack_size <= 1 and i in planned and passes_validation(response):
+                cache.record(make_test_id(category, test), model, system_prompt, test['query'], response,
+                             temperature=0, max_tokens=planned[i])
         
         # Final Results
         print("\n" + "=" * 60)
         print("🎯 COMPREHENSIVE TEST RESULTS")
         print("=" * 60)
-        print(f"Total Tests Run: {total_tests}")
+        print(f"Total Tests: {total_tests}")
+        print(f"Tests Run: {total_tests - skipped_tests}")
+        print(f"Tests Skipped (unchanged, counted as passed): {skipped_tests}")
         print(f"Tests Passed: {passed_tests}")
         print(f"Tests Failed: {total_tests - passed_tests}")
         print(f"Success Rate: {(passed_tests/total_tests)*100:.1f}%")
+        if cache is not None:
+            print(f"Cache: {cache.stats['hits']} hits, {cache.stats['semantic_hits']} semantic hits, "
+                  f"{cache.stats['misses']} misses, {cache.stats['errors']} errors")
+            cache.close()
         
         if passed_tests == total_tests:
             print("\n🎉 ALL TESTS PASSED! System is ready for comprehensive tax analysis.")
@@ -222,5 +720,17 @@ def run_comprehensive_tests():
         print(f"❌ Test suite failed to initialize: {str(e)}")
         sys.exit(1)
 
+def main():
+    parser = argparse.ArgumentParser(description="Comprehensive tax assistant test suite")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument('--batch', action='store_true',
+                      help='Submit scenarios via the Batch API (cheaper, not latency-sensitive)')
+    mode.add_argument('--pack', type=int, nargs='?', const=DEFAULT_PACK_SIZE, default=0, metavar='N',
+                      help=f'Pack N scenarios into each request (default N={DEFAULT_PACK_SIZE})')
+    parser.add_argument('--force', action='store_true',
+                        help='Re-run all tests, bypassing cached responses and unchanged-test skipping')
+    args = parser.parse_args()
+    asyncio.run(run_comprehensive_tests(use_batch=args.batch, pack_size=args.pack, force=args.force))
+
 if __name__ == "__main__":
-    run_comprehensive_tests()
\ No newline at end of file
+    main()
\ No newline at end of file